@@ -1,45 +1,176 @@
-﻿import os
+﻿if __name__ == "__main__":
+    # patch before anything imports socket/threading so request handlers and
+    # the log flusher become cooperative greenlets under the gevent server
+    try:
+        from gevent import monkey
+        monkey.patch_all()
+    except ImportError:
+        pass
+
+import os
+import atexit
 import hashlib
+import hmac
+import mmap
 import json
+import math
 import random
+import signal
+import sys
+import threading
 import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, jsonify
+from functools import partial
+from flask import Flask, request, jsonify, g
 from werkzeug.utils import secure_filename
 
+try:
+    import blake3
+except ImportError:  # optional: only needed when CONFIG["hash_algo"] is "blake3"
+    blake3 = None
+
+try:
+    import orjson
+except ImportError:  # optional: log_event falls back to the json module
+    orjson = None
+
 UPLOAD_DIR = "/data/uploads"
 LOG_FILE = "/data/logs/app.json"
+UPLOAD_CHUNK = 1 << 20  # 1 MiB copy buffer when writing uploads to disk
+LOG_FLUSH_INTERVAL = 0.1  # seconds between background flushes of the log buffer
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
+# one long-lived buffered handle instead of open/write/close per event
+_LOG_FH = open(LOG_FILE, "ab", buffering=1 << 20)
+_LOG_LOCK = threading.Lock()
+
+# naive utcnow() datetimes are rendered as "...Z", same as isoformat() + "Z"
+_ORJSON_OPTS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z if orjson else 0
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat() + "Z"
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def encode_event(data):
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=_ORJSON_OPTS)
+        except TypeError:
+            pass  # e.g. ints wider than 64 bits in an admin payload
+    return (json.dumps(data, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+
 def log_event(data: dict):
-    data.setdefault("timestamp", datetime.utcnow().isoformat() + "Z")
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    data.setdefault("timestamp", datetime.utcnow())
+    line = encode_event(data)
+    with _LOG_LOCK:
+        _LOG_FH.write(line)
+
+def flush_log():
+    with _LOG_LOCK:
+        if not _LOG_FH.closed:
+            _LOG_FH.flush()
+
+def _log_flusher():
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL)
+        flush_log()
+
+def _close_log():
+    with _LOG_LOCK:
+        _LOG_FH.close()
+
+threading.Thread(target=_log_flusher, name="log-flusher", daemon=True).start()
+atexit.register(_close_log)
 
 def sha256_of_file(path):
+    if sys.version_info >= (3, 11):
+        # file_digest reads straight into a preallocated buffer and hashes it in C
+        with open(path, "rb", buffering=0) as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
     h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # mmap can't map an empty file; the digest of b"" is just the fresh hash
+        if os.fstat(fd).st_size == 0:
+            return h.hexdigest()
+        # map the whole file so OpenSSL hashes it in a single update call
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        try:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            h.update(mm)
+        finally:
+            mm.close()
+    finally:
+        os.close(fd)
     return h.hexdigest()
 
+def pick_hash_algo():
+    # falls back to sha256 when blake3 isn't installed
+    if CONFIG.get("hash_algo") == "blake3" and blake3 is not None:
+        return "blake3"
+    return "sha256"
+
+def digest_of_file(path, algo):
+    if algo == "blake3":
+        return blake3.blake3(max_threads=blake3.blake3.AUTO).update_mmap(path).hexdigest()
+    return sha256_of_file(path)
+
+def _make_hash_pool():
+    workers = os.cpu_count() or 1
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched("threading"):
+            # patched threads are greenlets; hash on gevent's real OS threads instead
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor(max_workers=workers)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=workers)
+
+# uploads are hashed here so the response doesn't wait on the digest
+HASH_POOL = _make_hash_pool()
+_PENDING_HASHES = set()  # futures whose digest hasn't been logged yet
+
+def _log_upload_digest(fut, upload_id, filename, saved_path, algo):
+    try:
+        try:
+            digest = fut.result()
+        except Exception as e:
+            log_event({"event":"file_upload_hash_failed","upload_id":upload_id,"filename":filename,"saved_path":saved_path,"error":str(e)})
+            return
+        log_event({"event":"file_upload_hashed","upload_id":upload_id,"filename":filename,"saved_path":saved_path,"hash_algo":algo,algo:digest})
+    finally:
+        _PENDING_HASHES.discard(fut)
+
+def drain_hash_pool():
+    # called on shutdown so no upload is left without its digest in the log
+    HASH_POOL.shutdown(wait=True)
+    # gevent runs done-callbacks in the hub; keep yielding until they've logged
+    while _PENDING_HASHES:
+        time.sleep(0.01)
+
 app = Flask(__name__)
 VALID_USER = {"username": "testuser", "password": "Password123"}
 
 # ---------- Defense configuration (change via admin endpoint) ----------
 CONFIG = {
-    # Account lockout: if >= threshold attempts in window seconds, lock for duration seconds
+    # Account lockout: if >= threshold failed attempts in window seconds, lock for duration seconds
     "account_lock_threshold": 5,
     "account_lock_window": 300,
     "account_lock_duration": 600,
 
-    # Per-IP blocking: if >= threshold attempts in window seconds, block IP for duration seconds
+    # Per-IP blocking: if >= threshold failed attempts in window seconds, block IP for duration seconds
     "ip_block_threshold": 50,
     "ip_block_window": 60,
     "ip_block_duration": 600,
 
-    # Global rate limiting: if >= threshold requests across all clients in window seconds, enable global block for duration
+    # Global rate limiting: if >= threshold failed logins across all clients in window seconds, enable global block for duration
     "global_rate_threshold": 100,
     "global_rate_window": 60,
     "global_block_duration": 60,
@@ -48,88 +179,224 @@ CONFIG = {
     "fake_ip_enabled": False,
     "fake_ip_list": ["10.0.0.10", "10.0.0.11", "10.0.0.12"],
 
+    # Max keys kept in each per-IP / per-account state map (read at startup) so
+    # spoofed IPs or sprayed usernames can't grow memory. Least recently written
+    # keys are evicted; every lock/block gets the same duration, so for
+    # locked_accounts/blocked_ips that is also the entry expiring soonest
+    "max_tracked_ips": 16384,
+
+    # Upload content digest: "sha256" or "blake3" (multi-threaded, needs the blake3 package)
+    "hash_algo": "sha256",
+
     # Admin token (change before demos if desired)
     "admin_token": "admintoken"
 }
 
+_TRUE_STRINGS = frozenset({"1","true","yes"})
+
+# ---------- Admin config coercion ----------
+# Each value posted to /admin/config goes through its key's setter, so e.g.
+# "999999" can't end up compared against a float count as a string.
+def _to_bool(v):
+    if isinstance(v, str):
+        return v.strip().lower() in _TRUE_STRINGS
+    return bool(v)
+
+def _finite_float(v):
+    if isinstance(v, bool):
+        raise ValueError(f"expected a number, got {v!r}")
+    try:
+        f = float(v)
+    except OverflowError:
+        # JSON ints too large for a float
+        raise ValueError(f"out of range, got {v!r}") from None
+    # inf/nan would turn every `count >= threshold` / `now < until` check False
+    if not math.isfinite(f):
+        raise ValueError(f"must be finite, got {v!r}")
+    return f
+
+def _threshold(v):
+    f = _finite_float(v)
+    if f < 1 or f != int(f):
+        raise ValueError(f"must be a whole number >= 1, got {v!r}")
+    return int(f)
+
+MIN_WINDOW = 1.0  # seconds; tiny windows overflow bump_window's bucket index
+
+def _window(v):
+    f = _finite_float(v)
+    if f < MIN_WINDOW:
+        raise ValueError(f"must be >= {MIN_WINDOW:g}, got {v!r}")
+    return f
+
+def _duration(v):
+    f = _finite_float(v)
+    if f < 0:
+        raise ValueError(f"must be >= 0, got {v!r}")
+    return f
+
+def _str_list(v):
+    if isinstance(v, str):
+        v = [v]
+    if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+        raise ValueError(f"expected a list of strings, got {v!r}")
+    # get_logged_ip does random.choice() on this
+    if not v:
+        raise ValueError("must not be empty")
+    return list(v)
+
+def _hash_algo(v):
+    if v not in ("sha256", "blake3"):
+        raise ValueError(f"unknown hash_algo {v!r}")
+    return v
+
+def _admin_token(v):
+    # admin_auth compares against a "" default header, so an empty token
+    # would make every request without X-Admin-Token an admin
+    if not isinstance(v, str) or not v.strip():
+        raise ValueError("expected a non-empty string")
+    return v
+
+# keys /admin/config is allowed to change -> setter that validates/coerces the value
+_ADMIN_SETTERS = {
+    "account_lock_threshold": _threshold,
+    "account_lock_window": _window,
+    "account_lock_duration": _duration,
+    "ip_block_threshold": _threshold,
+    "ip_block_window": _window,
+    "ip_block_duration": _duration,
+    "global_rate_threshold": _threshold,
+    "global_rate_window": _window,
+    "global_block_duration": _duration,
+    "fake_ip_enabled": _to_bool,
+    "fake_ip_list": _str_list,
+    "hash_algo": _hash_algo,
+    "admin_token": _admin_token,
+}
+
 # ---------- In-memory state ----------
-account_attempts = {}   # username -> [timestamps]
-locked_accounts = {}    # username -> unlock_timestamp
+class LRUDict(OrderedDict):
+    """dict capped at maxsize entries; writes move a key to the end and the
+    least recently written keys are dropped once the cap is exceeded"""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+account_attempts = LRUDict(CONFIG["max_tracked_ips"])   # username -> (bucket, count, prev_count), see bump_window
+locked_accounts = LRUDict(CONFIG["max_tracked_ips"])    # username -> unlock_timestamp
 
-ip_attempts = {}        # ip -> [timestamps]
-blocked_ips = {}        # ip -> unblock_timestamp
+ip_attempts = LRUDict(CONFIG["max_tracked_ips"])        # ip -> (bucket, count, prev_count), see bump_window
+blocked_ips = LRUDict(CONFIG["max_tracked_ips"])        # ip -> unblock_timestamp
 
-global_attempts = []    # timestamps
+global_attempts = deque()  # timestamps, oldest first
 global_block_until = 0  # epoch seconds until which global blocking is active
 
+# Writers (record_login_attempt, admin reset/inspect) serialize on this lock.
+# The is_*_blocked checks stay lock-free: a single dict get or global read
+# is atomic under the GIL and never sees a half-applied update.
+_STATE_LOCK = threading.Lock()
+
 # ---------- Helper funcs ----------
 def now():
     return time.time()
 
-def prune_old(timestamps, window):
-    cutoff = now() - window
-    # keep only timestamps newer than cutoff
-    return [t for t in timestamps if t >= cutoff]
-
-def is_account_locked(username):
+def bump_window(counters, key, ts, window):
+    # Sliding-window counter: instead of storing every timestamp, keep the
+    # count for the current fixed-size bucket and the one before it, and
+    # weight the previous bucket by how much of it still overlaps the window.
+    # Constant memory per key; returns the estimated attempts in the window,
+    # rounded up: the weighted estimate undercounts a burst straddling a
+    # bucket boundary (5 failures in 2s could read 4.999 and never lock), so
+    # err toward locking early rather than letting the Nth failure through.
+    b = int(ts // window)
+    cur_b, count, prev = counters.get(key, (b, 0, 0))
+    if b == cur_b + 1:
+        prev, count = count, 0
+    elif b != cur_b:
+        prev, count = 0, 0
+    count += 1
+    counters[key] = (b, count, prev)
+    elapsed = ts - b * window
+    return math.ceil(count + prev * (1 - elapsed / window))
+
+def is_account_locked(username, ts=None):
     unlock = locked_accounts.get(username, 0)
-    return now() < unlock
+    return (now() if ts is None else ts) < unlock
 
-def is_ip_blocked(ip):
+def is_ip_blocked(ip, ts=None):
     unblock = blocked_ips.get(ip, 0)
-    return now() < unblock
-
-def record_login_attempt(username, ip):
-    ts = now()
-    # account attempts
-    lst = account_attempts.get(username, [])
-    lst.append(ts)
-    lst = prune_old(lst, CONFIG["account_lock_window"])
-    account_attempts[username] = lst
-    # ip attempts
-    ilst = ip_attempts.get(ip, [])
-    ilst.append(ts)
-    ilst = prune_old(ilst, CONFIG["ip_block_window"])
-    ip_attempts[ip] = ilst
-    # global attempts
-    global_attempts.append(ts)
-    # prune global attempts
-    cut = now() - CONFIG["global_rate_window"]
-    while global_attempts and global_attempts[0] < cut:
-        global_attempts.pop(0)
-
-    # evaluate account lock condition
-    if len(lst) >= CONFIG["account_lock_threshold"]:
-        locked_accounts[username] = now() + CONFIG["account_lock_duration"]
-        log_event({"event":"account_locked","username":username,"ip":ip,"threshold":CONFIG["account_lock_threshold"],"lock_until":locked_accounts[username]})
-    # evaluate IP block condition
-    if len(ilst) >= CONFIG["ip_block_threshold"]:
-        blocked_ips[ip] = now() + CONFIG["ip_block_duration"]
-        log_event({"event":"ip_blocked","ip":ip,"threshold":CONFIG["ip_block_threshold"],"block_until":blocked_ips[ip]})
-    # evaluate global block
-    if len(global_attempts) >= CONFIG["global_rate_threshold"]:
-        global global_block_until
-        global_block_until = now() + CONFIG["global_block_duration"]
-        log_event({"event":"global_rate_block","count":len(global_attempts),"block_until":global_block_until})
+    return (now() if ts is None else ts) < unblock
+
+def record_login_attempt(username, ip, ts=None):
+    global global_block_until
+    if ts is None:
+        ts = now()
+    events = []  # logged after releasing the lock
+    with _STATE_LOCK:
+        # account attempts
+        acct_count = bump_window(account_attempts, username, ts, CONFIG["account_lock_window"])
+        # ip attempts
+        ip_count = bump_window(ip_attempts, ip, ts, CONFIG["ip_block_window"])
+        # global attempts
+        global_attempts.append(ts)
+        # prune global attempts
+        cut = ts - CONFIG["global_rate_window"]
+        while global_attempts and global_attempts[0] < cut:
+            global_attempts.popleft()
+
+        # evaluate account lock condition
+        if acct_count >= CONFIG["account_lock_threshold"]:
+            locked_accounts[username] = ts + CONFIG["account_lock_duration"]
+            events.append({"event":"account_locked","username":username,"ip":ip,"threshold":CONFIG["account_lock_threshold"],"lock_until":locked_accounts[username]})
+        # evaluate IP block condition
+        if ip_count >= CONFIG["ip_block_threshold"]:
+            blocked_ips[ip] = ts + CONFIG["ip_block_duration"]
+            events.append({"event":"ip_blocked","ip":ip,"threshold":CONFIG["ip_block_threshold"],"block_until":blocked_ips[ip]})
+        # evaluate global block
+        if len(global_attempts) >= CONFIG["global_rate_threshold"]:
+            global_block_until = ts + CONFIG["global_block_duration"]
+            events.append({"event":"global_rate_block","count":len(global_attempts),"block_until":global_block_until})
+    for ev in events:
+        log_event(ev)
+
+def secure_equals(a, b):
+    # constant-time compare; compare_digest rejects non-ASCII str, so compare UTF-8 bytes
+    if not isinstance(a, str) or not isinstance(b, str):
+        return False
+    return hmac.compare_digest(a.encode("utf-8"), b.encode("utf-8"))
 
 def get_logged_ip():
     # real remote addr
     real_ip = request.remote_addr or "0.0.0.0"
     # fake ip override: headers-driven for testing (X-Use-Fake-IP: true)
-    if CONFIG.get("fake_ip_enabled") and request.headers.get("X-Use-Fake-IP", "").lower() in ("1","true","yes"):
+    if CONFIG.get("fake_ip_enabled") and request.headers.get("X-Use-Fake-IP", "").lower() in _TRUE_STRINGS:
         fake = random.choice(CONFIG.get("fake_ip_list", [real_ip]))
         return fake
     return real_ip
 
-def check_global_block():
-    return now() < global_block_until
+def check_global_block(ts=None):
+    return (now() if ts is None else ts) < global_block_until
 
 # ---------- Endpoints ----------
+@app.before_request
+def stamp_request():
+    # read the clock, client IP and UA once per request; handlers use g.*
+    g.now = now()
+    g.ip = get_logged_ip()
+    g.ua = request.headers.get("User-Agent")
+
 @app.route("/upload", methods=["POST"])
 def upload():
-    client_ip = get_logged_ip()
-    ua = request.headers.get("User-Agent")
-    if check_global_block():
+    client_ip = g.ip
+    ua = g.ua
+    if check_global_block(g.now):
         log_event({"event":"upload_blocked_global","ip":client_ip,"ua":ua})
         return jsonify({"error":"service rate-limited"}), 429
 
@@ -138,25 +405,34 @@ def upload():
         log_event({"event": "upload_attempt", "result": "no_file", "ip": client_ip, "ua": ua})
         return jsonify({"error": "no file"}), 400
     filename = secure_filename(file.filename)
-    saved_path = os.path.join(UPLOAD_DIR, filename)
-    file.save(saved_path)
-    sha = sha256_of_file(saved_path)
+    # unique path per upload: the hash job runs later, and a second upload
+    # with the same name must not replace the bytes it is about to hash
+    upload_id = uuid.uuid4().hex
+    saved_path = os.path.join(UPLOAD_DIR, f"{upload_id}_{filename}")
+    file.save(saved_path, buffer_size=UPLOAD_CHUNK)
+    algo = pick_hash_algo()
+    # log before submitting so "file_upload_hashed" can't land ahead of this
     log_event({
         "event": "file_upload",
+        "upload_id": upload_id,
         "ip": client_ip,
         "ua": ua,
         "filename": filename,
         "saved_path": saved_path,
-        "sha256": sha,
+        "hash_algo": algo,
         "content_length": request.content_length
     })
-    return jsonify({"ok": True, "filename": filename, "sha256": sha})
+    fut = HASH_POOL.submit(digest_of_file, saved_path, algo)
+    _PENDING_HASHES.add(fut)
+    fut.add_done_callback(partial(_log_upload_digest, upload_id=upload_id, filename=filename, saved_path=saved_path, algo=algo))
+    # the digest is logged as a "file_upload_hashed" event once it's ready
+    return jsonify({"ok": True, "upload_id": upload_id, "filename": filename, "hash_algo": algo, "hash_pending": True})
 
 @app.route("/submit", methods=["POST"])
 def submit():
-    client_ip = get_logged_ip()
-    ua = request.headers.get("User-Agent")
-    if check_global_block():
+    client_ip = g.ip
+    ua = g.ua
+    if check_global_block(g.now):
         log_event({"event":"submit_blocked_global","ip":client_ip,"ua":ua})
         return jsonify({"error":"service rate-limited"}), 429
     title = request.form.get("title", "")
@@ -177,29 +453,33 @@ def submit():
 def login():
     username = request.form.get("username", "")
     password = request.form.get("password", "")
-    client_ip = get_logged_ip()
-    ua = request.headers.get("User-Agent")
+    client_ip = g.ip
+    ua = g.ua
 
     # check global block
-    if check_global_block():
+    if check_global_block(g.now):
         log_event({"event":"login_blocked_global","ip":client_ip,"ua":ua,"username":username})
         # simulate denial: always 429
         return jsonify({"ok": False, "reason":"service rate-limited"}), 429
 
     # check IP block
-    if is_ip_blocked(client_ip):
+    if is_ip_blocked(client_ip, g.now):
         log_event({"event":"login_blocked_ip","ip":client_ip,"ua":ua,"username":username})
         return jsonify({"ok": False, "reason":"ip blocked"}), 429
 
     # check account lock
-    if is_account_locked(username):
+    if is_account_locked(username, g.now):
         log_event({"event":"login_blocked_account_locked","ip":client_ip,"ua":ua,"username":username})
         return jsonify({"ok": False, "reason":"account locked"}), 423
 
-    # At this point we will record the attempt (for thresholds)
-    record_login_attempt(username, client_ip)
+    # compare both fields so timing doesn't reveal which one was wrong
+    u_ok = secure_equals(username, VALID_USER["username"])
+    p_ok = secure_equals(password, VALID_USER["password"])
+    success = u_ok and p_ok
 
-    success = username == VALID_USER["username"] and password == VALID_USER["password"]
+    # only failed attempts count toward the thresholds
+    if not success:
+        record_login_attempt(username, client_ip, g.now)
     log_event({
         "event": "login_attempt",
         "ip": client_ip,
@@ -220,7 +500,7 @@ def index():
 # ---------- Admin endpoints to inspect and toggle config/state ----------
 def admin_auth():
     token = request.headers.get("X-Admin-Token", "")
-    return token == CONFIG.get("admin_token")
+    return secure_equals(token, CONFIG.get("admin_token"))
 
 @app.route("/admin/config", methods=["GET","POST"])
 def admin_config():
@@ -228,42 +508,66 @@ def admin_config():
         return "unauthorized", 401
     if request.method == "GET":
         # return a shallow copy of config and current state
-        state = {
-            "config": CONFIG,
-            "locked_accounts": {k: v for k,v in locked_accounts.items()},
-            "blocked_ips": {k: v for k,v in blocked_ips.items()},
-            "global_block_until": global_block_until
-        }
+        with _STATE_LOCK:
+            state = {
+                "config": CONFIG,
+                "locked_accounts": {k: v for k,v in locked_accounts.items()},
+                "blocked_ips": {k: v for k,v in blocked_ips.items()},
+                "global_block_until": global_block_until
+            }
         return jsonify(state)
     else:
-        # set provided config fields (whitelist keys)
-        allowed = {"account_lock_threshold","account_lock_window","account_lock_duration",
-                   "ip_block_threshold","ip_block_window","ip_block_duration",
-                   "global_rate_threshold","global_rate_window","global_block_duration",
-                   "fake_ip_enabled","fake_ip_list","admin_token"}
+        # set provided config fields (whitelisted keys, coerced per key)
         try:
             data = request.get_json() or {}
         except Exception:
             data = {}
+        if not isinstance(data, dict):
+            return jsonify({"ok": False, "error": "expected a JSON object"}), 400
+        rejected = {}
         for k,v in data.items():
-            if k in allowed:
-                CONFIG[k] = v
-        log_event({"event":"admin_config_update","changes":data,"by_ip":request.remote_addr})
-        return jsonify({"ok": True, "new_config": CONFIG})
+            setter = _ADMIN_SETTERS.get(k)
+            if setter is None:
+                continue
+            try:
+                CONFIG[k] = setter(v)
+            except (TypeError, ValueError) as e:
+                rejected[k] = str(e)
+        log_event({"event":"admin_config_update","changes":data,"rejected":rejected,"by_ip":request.remote_addr})
+        return jsonify({"ok": True, "new_config": CONFIG, "rejected": rejected})
 
 @app.route("/admin/reset_state", methods=["POST"])
 def admin_reset_state():
     if not admin_auth():
         return "unauthorized", 401
-    account_attempts.clear()
-    locked_accounts.clear()
-    ip_attempts.clear()
-    blocked_ips.clear()
-    global_attempts.clear()
     global global_block_until
-    global_block_until = 0
+    with _STATE_LOCK:
+        account_attempts.clear()
+        locked_accounts.clear()
+        ip_attempts.clear()
+        blocked_ips.clear()
+        global_attempts.clear()
+        global_block_until = 0
     log_event({"event":"admin_reset_state","by_ip":request.remote_addr})
     return jsonify({"ok": True})
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    # helper_gui and `docker compose down` stop us with SIGTERM, which skips
+    # atexit by default; exit cleanly instead so _close_log flushes the buffer
+    try:
+        import gevent
+        from gevent.pywsgi import WSGIServer
+    except ImportError:
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            app.run(host="0.0.0.0", port=5000)
+        finally:
+            drain_hash_pool()
+    else:
+        # one process on purpose: rate-limit state lives in this process' memory
+        server = WSGIServer(("0.0.0.0", 5000), app)
+        # runs in its own greenlet; serve_forever returns once stop() is done
+        gevent.signal_handler(signal.SIGTERM, server.stop)
+        server.serve_forever()
+        # from the main greenlet, so the hub keeps running the log callbacks
+        drain_hash_pool()
@@ -3,7 +3,7 @@
 helper_gui.py — Server control + attack launcher + security toggles
 
 Save/replace this file and run:
-  pip install requests
+  pip install requests aiohttp   (aiohttp optional: sends attempts concurrently)
   python helper_gui.py
 
 This GUI:
@@ -18,6 +18,9 @@ This GUI:
 """
 import os
 import sys
+import asyncio
+import codecs
+import selectors
 import threading
 import subprocess
 import time
@@ -26,6 +29,11 @@ from queue import Queue, Empty
 from tkinter import Tk, Button, Label, Entry, Text, Scrollbar, Checkbutton, IntVar, StringVar, Frame, END, LEFT
 import requests
 
+try:
+    import aiohttp
+except ImportError:  # fall back to sending attempts one by one with requests
+    aiohttp = None
+
 # ---------- Configuration defaults ----------
 DEFAULT_SERVER_URL = "http://localhost:5000"
 DEFAULT_PROJECT_PATH = os.path.expanduser("C:\\Users\\Conor\\Desktop\\projectattackdefend")  # change if you like
@@ -34,13 +42,45 @@ DEFAULT_PROJECT_PATH = os.path.expanduser("C:\\Users\\Conor\\Desktop\\projectatt
 server_proc = None
 server_stdout_thread = None
 server_stdout_queue = Queue()
+server_stdout_at_line_start = True
+
+# One thread multiplexes every child's stdout (POSIX only: on Windows
+# select() doesn't work on pipes, so each child gets a reader thread).
+STDOUT_CHUNK = 65536
+stdout_selector = selectors.DefaultSelector() if os.name != "nt" else None
+stdout_pump_thread = None
+stdout_pump_lock = threading.Lock()
 
 # ---------- Utility logging ----------
+# Text is queued and written with one insert per widget per flush; a Tk
+# insert+scroll per line is what made bursts of responses freeze the GUI.
+pending_log = {}  # widget -> [text, ...]
+pending_log_lock = threading.Lock()
+log_flush_scheduled = False
+
 def gui_log_insert(txt_widget, txt):
-    txt_widget.configure(state="normal")
-    txt_widget.insert(END, txt)
-    txt_widget.see(END)
-    txt_widget.configure(state="disabled")
+    global log_flush_scheduled
+    with pending_log_lock:
+        pending_log.setdefault(txt_widget, []).append(txt)
+        # Tk may only be touched from the main thread; text queued by worker
+        # threads is flushed by the periodic process_result_queue tick
+        schedule = not log_flush_scheduled and threading.current_thread() is threading.main_thread()
+        if schedule:
+            log_flush_scheduled = True
+    if schedule:
+        txt_widget.after_idle(flush_log_inserts)
+
+def flush_log_inserts():
+    global log_flush_scheduled
+    with pending_log_lock:
+        pending = dict(pending_log)
+        pending_log.clear()
+        log_flush_scheduled = False
+    for txt_widget, parts in pending.items():
+        txt_widget.configure(state="normal")
+        txt_widget.insert(END, "".join(parts))
+        txt_widget.see(END)
+        txt_widget.configure(state="disabled")
 
 def log(msg, txt_widget=None):
     timestamp = time.strftime("%H:%M:%S")
@@ -50,6 +90,52 @@ def log(msg, txt_widget=None):
     else:
         print(text, end='')
 
+# ---------- Server stdout forwarding ----------
+def pump_stdout():
+    while True:
+        for key, _ in stdout_selector.select(timeout=0.1):
+            q, decoder, pipe = key.data
+            try:
+                chunk = os.read(key.fd, STDOUT_CHUNK)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                q.put(f"SERVER STDOUT THREAD ERROR: {e}\n")
+                chunk = b""
+            if chunk:
+                text = decoder.decode(chunk)
+                if text:
+                    q.put(text)
+            else:
+                stdout_selector.unregister(key.fd)
+                pipe.close()
+
+def watch_stdout(proc, q):
+    """Forward proc's stdout to q in chunks; returns the thread doing it."""
+    global stdout_pump_thread
+    # incremental decoder so a UTF-8 sequence split across reads isn't mangled
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    if stdout_selector is None:
+        def read_chunks():
+            try:
+                while True:
+                    chunk = proc.stdout.read1(STDOUT_CHUNK)
+                    if not chunk:
+                        break
+                    q.put(decoder.decode(chunk))
+            except Exception as e:
+                q.put(f"SERVER STDOUT THREAD ERROR: {e}\n")
+        t = threading.Thread(target=read_chunks, daemon=True)
+        t.start()
+        return t
+    os.set_blocking(proc.stdout.fileno(), False)
+    stdout_selector.register(proc.stdout.fileno(), selectors.EVENT_READ, (q, decoder, proc.stdout))
+    with stdout_pump_lock:
+        if stdout_pump_thread is None:
+            stdout_pump_thread = threading.Thread(target=pump_stdout, daemon=True)
+            stdout_pump_thread.start()
+    return stdout_pump_thread
+
 # ---------- Server start/stop ----------
 def start_server_docker(compose_path, log_widget):
     global server_proc, server_stdout_thread
@@ -71,17 +157,7 @@ def start_server_docker(compose_path, log_widget):
         server_proc = None
         return
 
-    def stream_stdout(proc, q):
-        try:
-            for line in iter(proc.stdout.readline, b''):
-                if not line:
-                    break
-                q.put(line.decode(errors="replace"))
-        except Exception as e:
-            q.put(f"SERVER STDOUT THREAD ERROR: {e}\n")
-
-    server_stdout_thread = threading.Thread(target=stream_stdout, args=(server_proc, server_stdout_queue), daemon=True)
-    server_stdout_thread.start()
+    server_stdout_thread = watch_stdout(server_proc, server_stdout_queue)
     log(f"Server process started (PID {server_proc.pid}). Give it a few seconds to boot.", log_widget)
 
 def start_server_python(project_path, app_file, log_widget):
@@ -100,17 +176,7 @@ def start_server_python(project_path, app_file, log_widget):
     else:
         server_proc = subprocess.Popen(cmd, cwd=project_path, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, preexec_fn=os.setsid, shell=False)
 
-    def stream_stdout(proc, q):
-        try:
-            for line in iter(proc.stdout.readline, b''):
-                if not line:
-                    break
-                q.put(line.decode(errors="replace"))
-        except Exception as e:
-            q.put(f"SERVER STDOUT THREAD ERROR: {e}\n")
-
-    server_stdout_thread = threading.Thread(target=stream_stdout, args=(server_proc, server_stdout_queue), daemon=True)
-    server_stdout_thread.start()
+    server_stdout_thread = watch_stdout(server_proc, server_stdout_queue)
     log(f"Python server started (PID {server_proc.pid}).", log_widget)
 
 def stop_server(log_widget):
@@ -134,7 +200,43 @@ def stop_server(log_widget):
     log("Server stopped.", log_widget)
 
 # ---------- Attack sending ----------
-def send_login_attempts(target_url, username, password, count=1, use_fake_ip=False, delay=0.05, result_queue=None):
+async def send_login_attempts_async(target_url, username, password, count=1, use_fake_ip=False, result_queue=None, concurrency=50):
+    url = target_url.rstrip("/") + "/login"
+    data = {"username": username, "password": password}
+    headers = {}
+    if use_fake_ip:
+        headers["X-Use-Fake-IP"] = "true"
+
+    def emit(line):
+        if result_queue:
+            result_queue.put(line)
+        else:
+            print(line)
+
+    async def send_one(session, i):
+        try:
+            async with session.post(url, data=data, headers=headers) as resp:
+                text = (await resp.text()).strip()
+                emit(f"{time.strftime('%H:%M:%S')} -> {i+1}/{count}: {resp.status} {text}")
+                return resp.status == 200
+        except Exception as e:
+            emit(f"{time.strftime('%H:%M:%S')} -> {i+1}/{count}: ERROR {e!r}")
+            return False
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    # no total: it would also count time spent queued for one of the
+    # `concurrency` connections, timing out requests that were never sent
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(*(send_one(session, i) for i in range(count)))
+    emit(f"Done: {count} attempts, successes={sum(results)}")
+
+def send_login_attempts(target_url, username, password, count=1, use_fake_ip=False, delay=0.03, result_queue=None):
+    # with aiohttp, all attempts are in flight at once (up to 50 connections)
+    # and delay is ignored; without it they go out serially, delay apart
+    if aiohttp is not None:
+        asyncio.run(send_login_attempts_async(target_url, username, password, count=count, use_fake_ip=use_fake_ip, result_queue=result_queue))
+        return
     session = requests.Session()
     headers = {}
     if use_fake_ip:
@@ -280,23 +382,33 @@ def threaded_send(count):
     password = password_var.get().strip()
     use_fake = bool(fakeip_var.get())
     status_bar.config(text=f"Sending {count} attempts to {server} ...")
-    t = threading.Thread(target=lambda: send_login_attempts(server, username, password, count=count, use_fake_ip=use_fake, delay=0.03, result_queue=result_q), daemon=True)
+    t = threading.Thread(target=lambda: send_login_attempts(server, username, password, count=count, use_fake_ip=use_fake, result_queue=result_q), daemon=True)
     t.start()
 
 def process_result_queue():
+    global server_stdout_at_line_start
     try:
         while True:
             line = result_q.get_nowait()
             gui_log_insert(gui_log, line + "\n")
     except Empty:
         pass
-    # server stdout
+    # server stdout: arrives in arbitrary chunks, so prefix at line starts
+    # and insert everything drained this tick in one go
+    parts = []
     try:
         while True:
             s = server_stdout_queue.get_nowait()
-            gui_log_insert(gui_log, "[SERVER] " + s)
+            for piece in s.splitlines(True):
+                if server_stdout_at_line_start:
+                    parts.append("[SERVER] ")
+                parts.append(piece)
+                server_stdout_at_line_start = piece.endswith("\n")
     except Empty:
         pass
+    if parts:
+        gui_log_insert(gui_log, "".join(parts))
+    flush_log_inserts()
     root.after(200, process_result_queue)
 
 # Apply security settings action